@@ -1,28 +1,111 @@
-from fastapi import FastAPI, Query, Body
-from typing import List, Dict, Any
+import json
+import numpy as np
+from fastapi import FastAPI, Query, Body, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Callable, Optional
+from datetime import datetime, timedelta, timezone
+from tools.data_plane import data_plane
+from tools.preprocess import POLLUTANT_COLUMNS
+from tools.rolling_analytics import load_city_state
+from tools.llm_service import llm_service, build_analysis_prompt, LLMOverloaded
 
 app = FastAPI()
 
+def observed_end(city: str) -> int:
+    """Number of published hours at or before now; later ones are never reported as current"""
+    times = data_plane.get(city, "time")
+    if times is None:
+        return 0
+    return int(np.searchsorted(times, datetime.now(timezone.utc).timestamp(), side="right"))
+
+def latest_pollutants(city: str) -> Dict[str, float]:
+    """Most recent observed raw reading (ug/m3) of each pollutant from the shared data plane"""
+    end = observed_end(city)
+    if not end:
+        return {}
+    values = {}
+    for col in POLLUTANT_COLUMNS:
+        series = data_plane.get(city, col)
+        if series is not None and len(series) >= end:
+            values[col] = float(series[end - 1])
+    return values
+
+def submit_generation(prompt: str):
+    """Start or join a generation, answering 429 when the LLM queue is full"""
+    try:
+        return llm_service.submit(prompt)
+    except LLMOverloaded:
+        raise HTTPException(status_code=429, detail="LLM is busy, retry shortly", headers={"Retry-After": "1"})
+
+def wants_stream(request: Request, stream: Optional[bool]) -> bool:
+    """Stream on ?stream=true or an Accept: text/event-stream header; JSON otherwise"""
+    if stream is not None:
+        return stream
+    return "text/event-stream" in request.headers.get("accept", "")
+
+def stream_generation(generation, final: Callable[[str], Dict[str, Any]]) -> StreamingResponse:
+    """
+    Server-sent events: one data event per text chunk, then a done event
+    whose data is the endpoint's JSON body built from the full text.
+    """
+    async def events():
+        chunks = []
+        try:
+            async for chunk in generation.stream():
+                chunks.append(chunk)
+                yield f"data: {json.dumps(chunk)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps(f'LLM analysis failed: {e}')}\n\n"
+            return
+        yield f"event: done\ndata: {json.dumps(final(''.join(chunks)))}\n\n"
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def generation_text(generation) -> str:
+    try:
+        return await generation.text()
+    except Exception as e:
+        return f"LLM analysis failed: {e}"
+
 @app.get("/api/cities")
 def get_cities() -> List[str]:
     return ["New York", "Los Angeles", "Chicago", "Miami", "Seattle", "Denver"]
 
 @app.get("/api/city/{city}/current")
 def get_current_city_data(city: str) -> Dict[str, Any]:
-    # TODO: Load from processed data
-    return {}
+    pollutants = latest_pollutants(city)
+    if not pollutants:
+        return {}
+    times = data_plane.get(city, "time")
+    offset = data_plane.get(city, "utc_offset_seconds")
+    # Report in the city's local time with its real UTC offset
+    tz = timezone(timedelta(seconds=int(offset[0])))
+    return {
+        "city": city,
+        "pollutants": pollutants,
+        "time": datetime.fromtimestamp(int(times[observed_end(city) - 1]), tz=tz).isoformat(),
+    }
 
 @app.get("/api/city/{city}/trend")
 def get_city_trend(city: str) -> Dict[str, List[float]]:
-    return {"trend": []}
+    # Observed PM2.5 readings (ug/m3) of the last 48 hours up to now
+    series = data_plane.get(city, "pm2_5")
+    end = observed_end(city)
+    return {"trend": [] if series is None else series[max(end - 48, 0):end].tolist()}
 
 @app.get("/api/city/{city}/forecast")
-def get_city_forecast(city: str, range: str = Query("7d")) -> Dict[str, List[float]]:
-    return {"forecast": []}
+def get_city_forecast(city: str, range: str = Query("7d")) -> Dict[str, Any]:
+    # The forecast is fitted on processed data, so it is on the 0-1 min-max scale
+    forecast = data_plane.get(city, "forecast_normalized_pm2_5")
+    return {"forecast": [] if forecast is None else forecast.tolist(), "scale": "normalized"}
 
 @app.get("/api/city/{city}/pollutants")
 def get_city_pollutants(city: str) -> Dict[str, float]:
-    return {}
+    return latest_pollutants(city)
 
 @app.get("/api/compare")
 def compare_cities(city1: str, city2: str) -> Dict[str, Any]:
@@ -33,16 +116,41 @@ def get_map_locations() -> List[Dict[str, Any]]:
     return []
 
 @app.post("/api/llm/query")
-def llm_query(query: str = Body(...)) -> Dict[str, str]:
-    return {"response": ""}
+async def llm_query(request: Request, query: str = Body(...), stream: Optional[bool] = Query(None)):
+    generation = submit_generation(query)
+    if wants_stream(request, stream):
+        return stream_generation(generation, lambda text: {"response": text})
+    return {"response": await generation_text(generation)}
 
 @app.get("/api/city/{city}/insights")
-def get_city_insights(city: str) -> Dict[str, Any]:
-    return {"summary": "", "health": "", "recommendations": [], "trend": ""}
+async def get_city_insights(request: Request, city: str, stream: Optional[bool] = Query(None)):
+    state = await run_in_threadpool(load_city_state, city)
+    if not state.windows["pm2_5"].total_count:
+        return {"summary": "", "health": "", "recommendations": [], "trend": ""}
+
+    def insights(summary: str) -> Dict[str, Any]:
+        return {
+            "summary": summary,
+            "health": "",
+            "recommendations": [],
+            "trend": state.windows["pm2_5"].trend(),
+        }
+
+    # Same prompt for every viewer of a city until new data arrives, so
+    # concurrent dashboard requests share one generation
+    generation = submit_generation(build_analysis_prompt(city, state))
+    if wants_stream(request, stream):
+        return stream_generation(generation, insights)
+    return insights(await generation_text(generation))
 
 @app.get("/api/status")
 def get_status() -> Dict[str, str]:
-    return {"pipeline": "Operational", "ai": "Active", "uptime": "99.9%"}
+    return {
+        "pipeline": "Operational",
+        "ai": "Active",
+        "uptime": "99.9%",
+        "data_generation": data_plane.generation or "none",
+    }
 
 @app.get("/api/export/dashboard")
 def export_dashboard() -> Dict[str, Any]:
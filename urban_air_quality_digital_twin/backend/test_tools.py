@@ -6,6 +6,7 @@ import sys
 from tools.data_fetcher import main as fetch_data_main
 from tools.preprocess import clean_and_preprocess
 from tools.prediction import main as prediction_main
+from tools.backtest import main as backtest_main
 
 def test_tools():
     """Test each tool individually to ensure they work"""
@@ -33,6 +34,13 @@ def test_tools():
     except Exception as e:
         print(f"   ✗ Prediction tool failed: {e}")
     
+    try:
+        print("4. Testing Forecast Backtest...")
+        backtest_main()
+        print("   ✓ Forecast backtest completed successfully")
+    except Exception as e:
+        print(f"   ✗ Forecast backtest failed: {e}")
+    
     print("=" * 50)
     print("Tool testing completed!")
 
@@ -0,0 +1,84 @@
+# File: tests/test_backtest.py
+# Description: Checks incremental backtest caching, gap handling and history accumulation
+
+import copy
+import numpy as np
+import pandas as pd
+
+from tools import backtest
+from tools.backtest import HORIZON_HOURS, TRAIN_HOURS, backtest_series, update_history
+
+
+def _series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.abs(20 + np.cumsum(rng.normal(0, 3, n)))
+
+
+def _record_scored(monkeypatch):
+    scored = []
+    score_origins = backtest.score_origins
+
+    def recording(y, origins):
+        scored.extend(origins.tolist())
+        return score_origins(y, origins)
+
+    monkeypatch.setattr(backtest, 'score_origins', recording)
+    return scored
+
+
+def test_extended_history_only_scores_new_origins(monkeypatch):
+    y = _series(300)
+    cached = backtest_series(y[:200])
+    full = backtest_series(y)
+
+    scored = _record_scored(monkeypatch)
+    extended = backtest_series(y, copy.deepcopy(cached))
+    assert scored == list(range(200 - HORIZON_HOURS + 1, 300 - HORIZON_HOURS + 1))
+    assert extended["windows"] == full["windows"]
+    for key, values in full["sums"].items():
+        assert np.allclose(extended["sums"][key], values)
+
+    # A revised value inside the cached span invalidates the cache
+    scored.clear()
+    revised = y.copy()
+    revised[10] += 1
+    backtest_series(revised, copy.deepcopy(cached))
+    assert scored[0] == TRAIN_HOURS
+
+
+def test_windows_touching_a_gap_are_skipped(monkeypatch):
+    y = _series(200)
+    y[100] = np.nan
+    scored = _record_scored(monkeypatch)
+    entry = backtest_series(y)
+
+    touching = set(range(100 - HORIZON_HOURS + 1, 100 + TRAIN_HOURS + 1))
+    expected = [t for t in range(TRAIN_HOURS, 200 - HORIZON_HOURS + 1) if t not in touching]
+    assert scored == expected
+    assert entry["windows"] == len(expected)
+    assert all(np.isfinite(entry["sums"]["sq"]))
+
+
+def test_history_holds_back_hours_from_the_newest_fetch(monkeypatch, tmp_path):
+    monkeypatch.setattr(backtest, 'BACKTEST_DIR', str(tmp_path))
+    paths = []
+    for day in range(3):
+        times = pd.date_range('2024-01-01', periods=48, freq='h') + pd.Timedelta(days=day)
+        # Each fetch has its own values; later fetches revise overlapping hours
+        path = tmp_path / f"London_{day}.csv"
+        pd.DataFrame({
+            'time': times.strftime('%Y-%m-%dT%H:%M'),
+            'pm2_5': 100.0 * day + np.arange(48), 'pm10': 1.0, 'nitrogen_dioxide': 2.0,
+        }).to_csv(path, index=False)
+        paths.append(str(path))
+
+    history = update_history('London', paths[:2])
+    # Only the hours before the newest fetch starts are settled
+    assert history['time'].iloc[-1] == '2024-01-01T23:00'
+    assert history['pm2_5'].tolist() == list(np.arange(24.0))
+
+    # Re-reading the previous newest fetch settles its first day
+    history = update_history('London', paths[1:])
+    assert len(history) == 48
+    assert history['pm2_5'].tolist()[24:] == list(100.0 + np.arange(24.0))
+    assert pd.read_csv(tmp_path / 'London_history.csv')['time'].tolist() == history['time'].tolist()
@@ -0,0 +1,42 @@
+# File: tests/test_preprocess.py
+# Description: Checks that chunked preprocessing gives the same output as the in-memory path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools.preprocess import POLLUTANT_COLUMNS, process_file_in_memory, process_file_streaming
+
+
+def _raw_frame(rows=1000, duplicated=50, seed=0):
+    """Raw fetch rows with gaps, ending in a block that repeats earlier rows like an overlapping fetch"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'time': pd.date_range('2024-01-01', periods=rows, freq='h').strftime('%Y-%m-%dT%H:%M'),
+        **{col: rng.uniform(0, 80, rows).round(2) for col in POLLUTANT_COLUMNS},
+        'city': 'London',
+        'timestamp': np.where(np.arange(rows) < rows // 2, '20240101T000000Z', '20240121T000000Z'),
+    })
+    # Scattered gaps, a gap at the very start, and runs crossing chunk boundaries
+    for col in POLLUTANT_COLUMNS:
+        df.loc[rng.choice(rows, 80, replace=False), col] = np.nan
+    df.loc[:2, 'pm2_5'] = np.nan
+    df.loc[90:110, 'pm10'] = np.nan
+    df.loc[0, 'city'] = np.nan
+    return pd.concat([df, df.iloc[400:400 + duplicated]], ignore_index=True)
+
+
+@pytest.mark.parametrize('chunksize', [97, 1000, 5000])
+def test_streaming_matches_in_memory(tmp_path, chunksize):
+    raw_path = tmp_path / 'London_20240121T000000Z.csv'
+    _raw_frame().to_csv(raw_path, index=False)
+    in_memory_path = tmp_path / 'in_memory.csv'
+    streaming_path = tmp_path / 'streaming.csv'
+
+    process_file_in_memory(raw_path, in_memory_path)
+    process_file_streaming(str(raw_path), str(streaming_path), chunksize=chunksize)
+
+    expected = pd.read_csv(in_memory_path)
+    assert len(expected) == 1000
+    pd.testing.assert_frame_equal(pd.read_csv(streaming_path), expected)
+    assert not (tmp_path / 'streaming.csv.tmp').exists()
@@ -0,0 +1,150 @@
+# File: tests/test_rolling_analytics.py
+# Description: Checks the O(1) rolling-window statistics against direct recomputation
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+from tools.rolling_analytics import (
+    RollingWindow, CityRollingState, WINDOW_HOURS, SHORT_WINDOW_HOURS, MAX_FILL_HOURS,
+)
+
+THRESHOLD = 30.0
+
+
+def _series(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.abs(20 + np.cumsum(rng.normal(0, 3, n)))
+
+
+def test_window_matches_direct_recomputation():
+    values = _series()
+    window = RollingWindow(THRESHOLD)
+    for i, value in enumerate(values):
+        window.push(value)
+        tail = values[max(0, i + 1 - WINDOW_HOURS):i + 1]
+        recent = pd.Series(tail).iloc[-SHORT_WINDOW_HOURS:]
+        previous = pd.Series(tail).iloc[:-SHORT_WINDOW_HOURS]
+
+        assert window.count == len(tail)
+        assert np.isclose(window.mean(), tail.mean())
+        assert np.isclose(window.recent_mean(), recent.mean())
+        if len(previous):
+            assert np.isclose(window.previous_mean(), previous.mean())
+        assert window.exceedances == (tail > THRESHOLD).sum()
+        assert window.total_count == i + 1
+        assert np.isclose(window.lifetime_mean(), values[:i + 1].mean())
+        if len(tail) > 1:
+            x = np.arange(len(tail)).reshape(-1, 1)
+            slope = LinearRegression().fit(x, tail).coef_[0]
+            assert np.isclose(window.slope(), slope)
+
+
+def test_window_round_trips_through_dict():
+    window = RollingWindow(THRESHOLD)
+    for value in _series(100):
+        window.push(value)
+    restored = RollingWindow.from_dict(window.to_dict(), threshold=THRESHOLD)
+    assert restored.values() == window.values()
+    assert restored.total_count == window.total_count
+    assert np.isclose(restored.slope(), window.slope())
+    assert restored.exceedances == window.exceedances
+
+
+def test_change_point_flags_level_shift_only():
+    rng = np.random.default_rng(1)
+    steady = RollingWindow(THRESHOLD)
+    shifted = RollingWindow(THRESHOLD)
+    for value in 20 + rng.normal(0, 1, WINDOW_HOURS):
+        steady.push(value)
+    for i, value in enumerate(20 + rng.normal(0, 1, WINDOW_HOURS)):
+        shifted.push(value + (15 if i >= WINDOW_HOURS - SHORT_WINDOW_HOURS else 0))
+    assert not steady.change_point()
+    assert shifted.change_point()
+
+
+def test_state_only_ingests_new_hours():
+    times = pd.date_range('2024-01-01', periods=72, freq='h').strftime('%Y-%m-%dT%H:%M')
+    df = pd.DataFrame({'time': times, 'pm2_5': np.arange(72.0), 'pm10': 1.0, 'nitrogen_dioxide': 2.0})
+    df.loc[10, 'pm2_5'] = np.nan
+
+    state = CityRollingState('London')
+    assert state.update(df.iloc[:48]) == 48
+    # Overlapping fetch: only the 24 unseen hours are pushed
+    assert state.update(df) == 24
+    assert state.windows['pm2_5'].total_count == 72
+    assert state.last_time == times[-1]
+    # The gap is forward filled from the previous hour
+    assert state.windows['pm2_5'].total_sum == df['pm2_5'].ffill().sum()
+
+
+def _fetch(day, truth, fetched_at, offset=3600, hours=120):
+    """Raw fetch as saved by data_fetcher: today from 00:00 local plus forecast days"""
+    start = pd.Timestamp('2024-01-01') + pd.Timedelta(days=day)
+    local_times = pd.date_range(start, periods=hours, freq='h')
+    index = np.arange(day * 24, day * 24 + hours)
+    local_fetched_at = fetched_at + pd.Timedelta(seconds=offset)
+    # Hours after the fetch are forecasts and differ from what is observed later
+    forecast = np.where(local_times > local_fetched_at, 1000.0, 0.0)
+    return pd.DataFrame({
+        'time': local_times.strftime('%Y-%m-%dT%H:%M'),
+        'pm2_5': truth[index] + forecast,
+        'pm10': 1.0,
+        'nitrogen_dioxide': 2.0,
+        'timestamp': fetched_at.strftime('%Y%m%dT%H%M%SZ'),
+        'utc_offset_seconds': offset,
+    })
+
+
+def test_state_skips_forecast_hours_of_overlapping_fetches():
+    truth = np.arange(24 * 10, dtype=float)
+    state = CityRollingState('Paris')
+    pushed = []
+    for day in range(5):
+        # Fetched at 22:30 UTC, i.e. 23:30 local: the whole local day is observed
+        fetched_at = pd.Timestamp('2024-01-01 22:30') + pd.Timedelta(days=day)
+        pushed.append(state.update(_fetch(day, truth, fetched_at)))
+
+    assert pushed == [24] * 5
+    assert state.last_time == '2024-01-05T23:00'
+    window = state.windows['pm2_5']
+    assert window.total_count == 120
+    assert window.values() == truth[120 - WINDOW_HOURS:120].tolist()
+
+
+def test_state_ignores_fetches_without_utc_offset():
+    truth = np.arange(24 * 10, dtype=float)
+    df = _fetch(0, truth, pd.Timestamp('2024-01-01 22:30')).drop(columns='utc_offset_seconds')
+    state = CityRollingState('Paris')
+    assert state.update(df) == 0
+    assert state.last_time is None
+
+
+def _hours(start, count, first_value):
+    times = pd.date_range(start, periods=count, freq='h').strftime('%Y-%m-%dT%H:%M')
+    values = np.arange(first_value, first_value + count, dtype=float)
+    return pd.DataFrame({'time': times, 'pm2_5': values, 'pm10': values, 'nitrogen_dioxide': values})
+
+
+def test_state_fills_short_gaps_between_updates():
+    state = CityRollingState('London')
+    state.update(_hours('2024-01-01 00:00', 24, 0))
+    # Hours 24..26 are missing and take the last reading before them
+    assert state.update(_hours('2024-01-02 03:00', 10, 27)) == 3 + 10
+    window = state.windows['pm2_5']
+    assert window.values()[-14:] == [23.0, 23.0, 23.0, 23.0] + list(np.arange(27.0, 37.0))
+    assert state.last_time == '2024-01-02T12:00'
+
+
+def test_state_restarts_windows_after_long_gap():
+    state = CityRollingState('London')
+    state.update(_hours('2024-01-01 00:00', 24, 0))
+    gap = MAX_FILL_HOURS + 1
+    df = _hours('2024-01-02 00:00', 30, 24)
+    df = df.drop(index=range(5, 5 + gap))
+    assert state.update(df) == 30 - 5 - gap
+    window = state.windows['pm2_5']
+    # Only the hours after the gap are in the window; lifetime totals keep counting
+    assert window.values() == list(np.arange(24.0 + 5 + gap, 54.0))
+    assert window.total_count == 24 + 30 - 5 - gap
+    assert state.last_time == '2024-01-03T05:00'
@@ -0,0 +1,255 @@
+# File: src/urban_air_quality_digital_twin/tools/backtest.py
+# Description: Rolling-origin backtesting of the 24h forecaster with per-horizon accuracy metrics
+#
+# Processed files are min-max scaled per fetch, so the backtest runs on raw
+# readings instead: every fetch is merged into one hourly history per city
+# (data/processed/backtests/{city}_history.csv) that grows across runs.
+
+import os
+import json
+import hashlib
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from dotenv import load_dotenv
+from tools.catalog import artifacts_between, record_artifact
+
+PROCESSED_DATA_DIR = os.path.join(os.path.dirname(__file__), '../../../data/processed')
+BACKTEST_DIR = os.path.join(PROCESSED_DATA_DIR, 'backtests')
+
+load_dotenv()
+
+TARGET_COLUMNS = ['pm2_5', 'pm10', 'nitrogen_dioxide']
+HISTORY_COLUMNS = ['time'] + TARGET_COLUMNS
+TRAIN_HOURS = 48    # History the forecaster fits on (see prediction.forecast_next_24h)
+HORIZON_HOURS = 24  # Hours forecast from each origin
+BATCH_ORIGINS = 10000
+MAX_WORKERS = int(os.getenv('BACKTEST_WORKERS', '0')) or None
+
+
+def _series_hash(y):
+    return hashlib.sha1(np.ascontiguousarray(y, dtype=np.float64).tobytes()).hexdigest()
+
+
+def _empty_sums():
+    return {key: [0.0] * HORIZON_HOURS for key in ('sq', 'abs', 'persist_sq', 'persist_abs')}
+
+
+def score_origins(y, origins):
+    """
+    Score forecasts issued at each origin t (trained on y[t-48:t], checked
+    against y[t:t+24]) in one batched array computation.
+
+    The linear trend fit is solved in closed form for all windows at once,
+    which gives the same fit as forecast_next_24h's LinearRegression. That
+    function clips to the normalized [0, 1] range; on raw readings only the
+    lower bound at zero carries over.
+    Returns per-horizon sums of squared and absolute errors for the model and
+    for a persistence forecast (last observed value).
+    """
+    x = np.arange(TRAIN_HOURS, dtype=np.float64)
+    x_centered = x - x.mean()
+    x_future = np.arange(TRAIN_HOURS, TRAIN_HOURS + HORIZON_HOURS, dtype=np.float64)
+    train_windows = sliding_window_view(y, TRAIN_HOURS)
+    target_windows = sliding_window_view(y, HORIZON_HOURS)
+
+    sums = {key: np.zeros(HORIZON_HOURS) for key in ('sq', 'abs', 'persist_sq', 'persist_abs')}
+    for start in range(0, len(origins), BATCH_ORIGINS):
+        batch = origins[start:start + BATCH_ORIGINS]
+        train = train_windows[batch - TRAIN_HOURS]
+        actual = target_windows[batch]
+
+        y_mean = train.mean(axis=1)
+        slope = (train - y_mean[:, None]) @ x_centered / (x_centered @ x_centered)
+        intercept = y_mean - slope * x.mean()
+        pred = np.clip(intercept[:, None] + slope[:, None] * x_future, 0, None)
+        err = pred - actual
+        persist_err = y[batch - 1][:, None] - actual
+
+        sums['sq'] += (err ** 2).sum(axis=0)
+        sums['abs'] += np.abs(err).sum(axis=0)
+        sums['persist_sq'] += (persist_err ** 2).sum(axis=0)
+        sums['persist_abs'] += np.abs(persist_err).sum(axis=0)
+    return {key: value.tolist() for key, value in sums.items()}
+
+
+def backtest_series(y, cached=None):
+    """
+    Backtest one hourly series, reusing cached sums when the data they were
+    computed from is unchanged so only new origins are scored. Origins whose
+    train or target window contains a gap (NaN) are skipped.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    nan_count = np.concatenate([[0], np.cumsum(np.isnan(y))])
+    first_origin = TRAIN_HOURS
+    last_origin = len(y) - HORIZON_HOURS  # inclusive
+
+    entry = {"next_origin": first_origin, "prefix_hash": None, "windows": 0, "sums": _empty_sums()}
+    if cached and cached.get("next_origin", 0) <= last_origin + 1:
+        used = cached["next_origin"] - 1 + HORIZON_HOURS
+        if cached.get("prefix_hash") == _series_hash(y[:used]):
+            entry = cached
+
+    if entry["next_origin"] <= last_origin:
+        origins = np.arange(entry["next_origin"], last_origin + 1)
+        complete = nan_count[origins + HORIZON_HOURS] == nan_count[origins - TRAIN_HOURS]
+        origins = origins[complete]
+        if len(origins):
+            new_sums = score_origins(y, origins)
+            entry["sums"] = {
+                key: (np.asarray(entry["sums"][key]) + np.asarray(new_sums[key])).tolist()
+                for key in new_sums
+            }
+            entry["windows"] += len(origins)
+        entry["next_origin"] = last_origin + 1
+        entry["prefix_hash"] = _series_hash(y[:last_origin + HORIZON_HOURS])
+    return entry
+
+
+def summarize(entry):
+    """Per-horizon RMSE, MAE and skill vs. persistence (1 - RMSE / persistence RMSE)"""
+    n = entry["windows"]
+    if not n:
+        return {"windows": 0}
+    sums = {key: np.asarray(value) for key, value in entry["sums"].items()}
+    rmse = np.sqrt(sums['sq'] / n)
+    persist_rmse = np.sqrt(sums['persist_sq'] / n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        skill = np.where(persist_rmse > 0, 1 - rmse / persist_rmse, np.nan)
+    return {
+        "windows": n,
+        "horizon": list(range(1, HORIZON_HOURS + 1)),
+        "rmse": rmse.tolist(),
+        "mae": (sums['abs'] / n).tolist(),
+        "persistence_rmse": persist_rmse.tolist(),
+        "persistence_mae": (sums['persist_abs'] / n).tolist(),
+        "skill": [None if np.isnan(s) else float(s) for s in skill],
+    }
+
+
+def _cache_path(city):
+    return os.path.join(BACKTEST_DIR, f"{city}_backtest_cache.json")
+
+
+def _history_path(city):
+    return os.path.join(BACKTEST_DIR, f"{city}_history.csv")
+
+
+def update_history(city, raw_paths):
+    """
+    Append settled raw readings from raw_paths (oldest fetch first) to the
+    city's history and return the full history.
+
+    Overlapping hours take the newest fetch's value. Hours from the start of
+    the newest fetch onward can still be revised by the next fetch (and
+    include Open-Meteo forecast hours), so they are held back until a later
+    fetch moves past them. Settled rows never change, which keeps the
+    cached sums valid.
+    """
+    path = _history_path(city)
+    if os.path.exists(path):
+        history = pd.read_csv(path)
+    else:
+        history = pd.DataFrame(columns=HISTORY_COLUMNS)
+
+    frames = []
+    for raw_path in raw_paths:
+        try:
+            frames.append(pd.read_csv(raw_path, usecols=lambda c: c in HISTORY_COLUMNS))
+        except Exception as e:
+            print(f"Error reading {raw_path}: {e}")
+    if not frames:
+        return history
+
+    newest_start = frames[-1]['time'].min()
+    fetched = pd.concat(frames).drop_duplicates('time', keep='last')
+    settled = fetched[fetched['time'] < newest_start]
+    if len(history):
+        settled = settled[settled['time'] > history['time'].iloc[-1]]
+    settled = settled.sort_values('time').reindex(columns=HISTORY_COLUMNS)
+    if not settled.empty:
+        settled.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+        history = pd.concat([history, settled], ignore_index=True)
+    return history
+
+
+def _hourly(history):
+    """History on a continuous hourly index, missing hours as NaN"""
+    if history.empty:
+        return pd.DataFrame(columns=TARGET_COLUMNS, dtype=float)
+    times = pd.to_datetime(history['time'])
+    hourly = history.set_index(times)[TARGET_COLUMNS].astype(float)
+    return hourly.reindex(pd.date_range(times.min(), times.max(), freq='h'))
+
+
+def _backtest_city(city, raw_paths, cache):
+    hourly = _hourly(update_history(city, raw_paths))
+    series = cache.get("series", {})
+    entries = {
+        col: backtest_series(hourly[col].to_numpy(), series.get(col))
+        for col in TARGET_COLUMNS
+    }
+    return city, entries
+
+
+def run_backtest(cities):
+    """Backtest every city's accumulated raw history in a process pool"""
+    os.makedirs(BACKTEST_DIR, exist_ok=True)
+    jobs = []
+    caches = {}
+    for city in cities:
+        cache = {}
+        if os.path.exists(_cache_path(city)):
+            with open(_cache_path(city), 'r') as f:
+                cache = json.load(f)
+        # Re-read the last fetch seen before: its held-back hours may settle now
+        raw_entries = [
+            entry for entry in artifacts_between(city, 'raw', start=cache.get("last_fetch"))
+            if os.path.exists(entry['path'])
+        ]
+        if not raw_entries and not os.path.exists(_history_path(city)):
+            print(f"No raw data found for {city}")
+            continue
+        if raw_entries:
+            cache["last_fetch"] = raw_entries[-1]['timestamp']
+        caches[city] = cache
+        jobs.append((city, [entry['path'] for entry in raw_entries], cache))
+
+    reports = {}
+    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = [pool.submit(_backtest_city, *job) for job in jobs]
+        for future in futures:
+            try:
+                city, entries = future.result()
+            except Exception as e:
+                print(f"Error backtesting: {e}")
+                continue
+            cache = {"last_fetch": caches[city].get("last_fetch"), "series": entries}
+            with open(_cache_path(city), 'w') as f:
+                json.dump(cache, f)
+            reports[city] = {col: summarize(entry) for col, entry in entries.items()}
+    return reports
+
+
+def main():
+    cities = [city.strip() for city in os.getenv('CITY_LIST', 'London,Paris,New York').split(',')]
+    reports = run_backtest(cities)
+    timestamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    for city, report in reports.items():
+        report_path = os.path.join(PROCESSED_DATA_DIR, f"{city}_backtest_{timestamp}.json")
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        record_artifact(city, 'backtest', report_path, timestamp)
+        for col, summary in report.items():
+            if summary["windows"]:
+                print(
+                    f"{city} {col}: {summary['windows']} windows, "
+                    f"RMSE@1h {summary['rmse'][0]:.3f}, RMSE@24h {summary['rmse'][-1]:.3f}, "
+                    f"skill@24h {summary['skill'][-1]}"
+                )
+        print(f"Saved backtest report to {report_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# File: src/urban_air_quality_digital_twin/tools/catalog.py
+# Description: SQLite catalog of pipeline artifacts for indexed "latest" and time-range lookups
+
+import os
+import re
+import sqlite3
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+RAW_DATA_DIR = os.path.join(os.path.dirname(__file__), '../../../data/raw')
+PROCESSED_DATA_DIR = os.path.join(os.path.dirname(__file__), '../../../data/processed')
+PLOTS_DIR = os.path.join(PROCESSED_DATA_DIR, 'plots')
+CATALOG_PATH = os.path.join(PROCESSED_DATA_DIR, 'catalog.sqlite')
+
+load_dotenv()
+
+# Retention: artifacts older than ARTIFACT_RETENTION_DAYS are deleted, except
+# the newest ARTIFACT_KEEP_LATEST per city and kind. 0 days disables retention.
+RETENTION_DAYS = int(os.getenv('ARTIFACT_RETENTION_DAYS', '0'))
+KEEP_LATEST = int(os.getenv('ARTIFACT_KEEP_LATEST', '24'))
+
+TIMESTAMP_FORMAT = '%Y%m%dT%H%M%SZ'
+ARTIFACT_KINDS = ('raw', 'processed', 'forecast', 'scenario', 'analysis', 'plot', 'backtest')
+
+# File name patterns written by the pipeline, used to index pre-existing files
+_TS = r'(?P<timestamp>\d{8}T\d{6}Z)'
+FILENAME_PATTERNS = [
+    (RAW_DATA_DIR, 'raw', re.compile(rf'^(?P<city>.+)_{_TS}\.csv$')),
+    (PROCESSED_DATA_DIR, 'processed', re.compile(rf'^(?P<city>.+)_{_TS}_processed\.csv$')),
+    (PROCESSED_DATA_DIR, 'forecast', re.compile(rf'^(?P<city>.+)_forecast_{_TS}\.json$')),
+    (PROCESSED_DATA_DIR, 'scenario', re.compile(rf'^(?P<city>.+)_scenario_{_TS}\.json$')),
+    (PROCESSED_DATA_DIR, 'analysis', re.compile(rf'^(?P<city>.+)_llm_analysis_{_TS}\.json$')),
+    (PROCESSED_DATA_DIR, 'backtest', re.compile(rf'^(?P<city>.+)_backtest_{_TS}\.json$')),
+    (PLOTS_DIR, 'plot', re.compile(r'^(?P<city>.+)_trend\.png$')),
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    id INTEGER PRIMARY KEY,
+    city TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_city_kind_ts ON artifacts (city, kind, timestamp);
+CREATE INDEX IF NOT EXISTS idx_artifacts_kind_ts ON artifacts (kind, timestamp);
+"""
+
+
+def _format_timestamp(value):
+    if value is None:
+        return datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    return str(value)
+
+
+def _connect():
+    os.makedirs(os.path.dirname(CATALOG_PATH), exist_ok=True)
+    is_new = not os.path.exists(CATALOG_PATH)
+    conn = sqlite3.connect(CATALOG_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    if is_new:
+        _index_existing_files(conn)
+    return conn
+
+
+def _index_existing_files(conn):
+    """Register files written before the catalog existed (one-time scan)"""
+    for directory, kind, pattern in FILENAME_PATTERNS:
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            match = pattern.match(name)
+            if not match:
+                continue
+            path = os.path.join(directory, name)
+            timestamp = match.groupdict().get('timestamp') or _format_timestamp(
+                datetime.utcfromtimestamp(os.path.getmtime(path))
+            )
+            _upsert(conn, match.group('city'), kind, path, timestamp)
+    conn.commit()
+
+
+def _upsert(conn, city, kind, path, timestamp):
+    path = os.path.abspath(path)
+    size = os.path.getsize(path) if os.path.exists(path) else None
+    conn.execute(
+        "INSERT INTO artifacts (city, kind, timestamp, path, size) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(path) DO UPDATE SET city = excluded.city, kind = excluded.kind, "
+        "timestamp = excluded.timestamp, size = excluded.size",
+        (city, kind, timestamp, path, size),
+    )
+
+
+def record_artifact(city, kind, path, timestamp=None):
+    """Record a file the pipeline has just written"""
+    if kind not in ARTIFACT_KINDS:
+        raise ValueError(f"Unknown artifact kind: {kind}")
+    with _connect() as conn:
+        _upsert(conn, city, kind, path, _format_timestamp(timestamp))
+    conn.close()
+
+
+def record_derived_artifact(source_path, kind, path):
+    """Record path under the city and timestamp of the artifact it was built from"""
+    source = get_artifact(source_path)
+    if source is None:
+        name = os.path.basename(source_path)
+        match = next((p.match(name) for _, _, p in FILENAME_PATTERNS if p.match(name)), None)
+        if match is None or 'timestamp' not in match.groupdict():
+            print(f"Cannot catalog {path}: unknown source {source_path}")
+            return
+        source = match.groupdict()
+    record_artifact(source['city'], kind, path, source['timestamp'])
+
+
+def get_artifact(path):
+    """Catalog entry for a path, or None"""
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT * FROM artifacts WHERE path = ?", (os.path.abspath(path),)
+        ).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def latest_artifact(city, kind):
+    """Path of the newest artifact of a kind for a city, or None"""
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT path FROM artifacts WHERE city = ? AND kind = ? "
+            "ORDER BY timestamp DESC LIMIT 1",
+            (city, kind),
+        ).fetchone()
+    conn.close()
+    return row['path'] if row else None
+
+
+def artifacts_between(city, kind, start=None, end=None):
+    """Catalog entries for a city and kind with start <= timestamp <= end, oldest first"""
+    query = "SELECT * FROM artifacts WHERE city = ? AND kind = ?"
+    params = [city, kind]
+    if start is not None:
+        query += " AND timestamp >= ?"
+        params.append(_format_timestamp(start))
+    if end is not None:
+        query += " AND timestamp <= ?"
+        params.append(_format_timestamp(end))
+    query += " ORDER BY timestamp"
+    with _connect() as conn:
+        rows = conn.execute(query, params).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+
+def apply_retention(max_age_days=RETENTION_DAYS, keep_latest=KEEP_LATEST):
+    """
+    Delete artifacts older than max_age_days, keeping the newest keep_latest
+    per city and kind, then compact the catalog. Returns the number removed.
+    """
+    if max_age_days <= 0:
+        return 0
+    cutoff = _format_timestamp(datetime.utcnow() - timedelta(days=max_age_days))
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT id, path FROM ("
+            "  SELECT id, path, timestamp, ROW_NUMBER() OVER ("
+            "    PARTITION BY city, kind ORDER BY timestamp DESC) AS rank"
+            "  FROM artifacts"
+            ") WHERE rank > ? AND timestamp < ?",
+            (keep_latest, cutoff),
+        ).fetchall()
+        for row in rows:
+            try:
+                if os.path.exists(row['path']):
+                    os.remove(row['path'])
+            except OSError as e:
+                print(f"Error removing {row['path']}: {e}")
+                continue
+            conn.execute("DELETE FROM artifacts WHERE id = ?", (row['id'],))
+    conn.close()
+    if rows:
+        compact()
+    return len(rows)
+
+
+def compact():
+    """Drop entries whose files are gone and reclaim space in the catalog"""
+    with _connect() as conn:
+        stale = [
+            (row['id'],) for row in conn.execute("SELECT id, path FROM artifacts")
+            if not os.path.exists(row['path'])
+        ]
+        conn.executemany("DELETE FROM artifacts WHERE id = ?", stale)
+    conn.execute("VACUUM")
+    conn.close()
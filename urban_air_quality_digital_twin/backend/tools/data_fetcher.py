@@ -7,6 +7,7 @@ import pandas as pd
 from datetime import datetime
 from time import sleep
 from dotenv import load_dotenv
+from tools.catalog import record_artifact, TIMESTAMP_FORMAT
 
 RAW_DATA_DIR = os.path.join(os.path.dirname(__file__), '../../../data/raw')
 
@@ -52,19 +53,38 @@ def fetch_city_data(city, lat, lon, retries=3, delay=5):
 
 
 def save_raw_data(city, data):
-    timestamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    timestamp = datetime.utcnow().strftime(TIMESTAMP_FORMAT)
     filename = f"{city}_{timestamp}.csv"
     filepath = os.path.join(RAW_DATA_DIR, filename)
     if 'hourly' in data:
         df = pd.DataFrame(data['hourly'])
         df['city'] = city
         df['timestamp'] = timestamp
+        # 'time' is local (timezone=auto); keep the offset to recover UTC
+        df['utc_offset_seconds'] = data.get('utc_offset_seconds', 0)
         df.to_csv(filepath, index=False)
+        record_artifact(city, 'raw', filepath, timestamp)
         print(f"Saved raw data for {city} to {filepath}")
     else:
         print(f"No hourly data found for {city}")
 
 
+def observed_readings(df):
+    """
+    Rows of a raw fetch at or before the hour it was fetched.
+
+    Open-Meteo returns today from 00:00 local plus several forecast days, so
+    most rows of a fetch are forecasts. 'time' is local and 'timestamp' the
+    UTC fetch time; fetches saved without utc_offset_seconds cannot be lined
+    up with their fetch time, so none of their rows count as observed.
+    """
+    if 'utc_offset_seconds' not in df.columns:
+        return df.iloc[0:0]
+    fetched_at = pd.to_datetime(df['timestamp'].astype(str), format=TIMESTAMP_FORMAT)
+    local_fetched_at = fetched_at + pd.to_timedelta(df['utc_offset_seconds'], unit='s')
+    return df[pd.to_datetime(df['time']) <= local_fetched_at]
+
+
 def main():
     os.makedirs(RAW_DATA_DIR, exist_ok=True)
     for city in CITY_LIST:
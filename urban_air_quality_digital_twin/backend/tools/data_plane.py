@@ -0,0 +1,184 @@
+# File: src/urban_air_quality_digital_twin/tools/data_plane.py
+# Description: Read-only memory-mapped data plane shared by all API worker processes
+
+import os
+import json
+import mmap
+import time
+import shutil
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from tools.catalog import latest_artifact
+from tools.data_fetcher import observed_readings
+from tools.preprocess import POLLUTANT_COLUMNS
+
+PROCESSED_DATA_DIR = os.path.join(os.path.dirname(__file__), '../../../data/processed')
+DATA_PLANE_DIR = os.path.join(PROCESSED_DATA_DIR, 'data_plane')
+CURRENT_FILE = os.path.join(DATA_PLANE_DIR, 'CURRENT')
+
+load_dotenv()
+
+# How often readers check for a newly published generation
+REFRESH_SECONDS = float(os.getenv('DATA_PLANE_REFRESH_SECONDS', '1'))
+# Generations kept on disk; older ones are removed after a publish
+KEEP_GENERATIONS = 2
+ALIGNMENT = 64
+
+
+# --- Publishing (pipeline side) ---
+def _city_arrays(city):
+    """
+    Series and forecast arrays for a city, keyed by name.
+
+    Series are the observed raw readings (ug/m3) of the latest fetch, sorted
+    by hour, with 'time' in UTC epoch seconds; Open-Meteo times are local and
+    the fetch's forecast hours are left out. Fetches saved without
+    utc_offset_seconds cannot be placed in time and publish no series.
+    Forecasts come from the processed (min-max normalized) data and are
+    published as forecast_normalized_{col}.
+    """
+    arrays = {}
+    raw_path = latest_artifact(city, 'raw')
+    if raw_path and os.path.exists(raw_path):
+        df = observed_readings(pd.read_csv(raw_path))
+        if not df.empty:
+            df = df.drop_duplicates('time', keep='last').sort_values('time')
+            offset = int(df['utc_offset_seconds'].iloc[0])
+            local = pd.to_datetime(df['time']).to_numpy().astype('datetime64[s]').astype(np.int64)
+            arrays['time'] = local - offset
+            arrays['utc_offset_seconds'] = np.array([offset], dtype=np.int64)
+            for col in POLLUTANT_COLUMNS:
+                if col in df.columns:
+                    arrays[col] = df[col].to_numpy(dtype=np.float64)
+    forecast_path = latest_artifact(city, 'forecast')
+    if forecast_path and os.path.exists(forecast_path):
+        with open(forecast_path, 'r') as f:
+            for col, values in json.load(f).items():
+                arrays[f"forecast_normalized_{col}"] = np.asarray(values, dtype=np.float64)
+    return arrays
+
+
+def publish_data_plane(cities):
+    """
+    Write every city's arrays into one new generation and atomically make it current.
+
+    A generation is a directory holding data.bin (all arrays back to back)
+    and index.json (offset, dtype and shape of each array). Readers only
+    switch once the CURRENT pointer is replaced, so they never see a
+    half-written generation.
+    """
+    generation = f"gen-{datetime.utcnow().strftime('%Y%m%dT%H%M%S%fZ')}"
+    gen_dir = os.path.join(DATA_PLANE_DIR, generation)
+    os.makedirs(gen_dir, exist_ok=True)
+
+    index = {"generation": generation, "cities": {}}
+    offset = 0
+    with open(os.path.join(gen_dir, 'data.bin'), 'wb') as f:
+        for city in cities:
+            arrays = _city_arrays(city)
+            if not arrays:
+                print(f"No data to publish for {city}")
+                continue
+            entries = {}
+            for name, array in arrays.items():
+                padding = -offset % ALIGNMENT
+                f.write(b'\0' * padding)
+                offset += padding
+                data = np.ascontiguousarray(array).tobytes()
+                f.write(data)
+                entries[name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+                offset += len(data)
+            index["cities"][city] = entries
+    with open(os.path.join(gen_dir, 'index.json'), 'w') as f:
+        json.dump(index, f)
+
+    tmp_path = CURRENT_FILE + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(generation)
+    os.replace(tmp_path, CURRENT_FILE)
+    print(f"Published data plane generation {generation}")
+
+    # Workers still mapping an old generation keep their mapping after unlink
+    old = sorted(d for d in os.listdir(DATA_PLANE_DIR) if d.startswith('gen-'))[:-KEEP_GENERATIONS]
+    for name in old:
+        shutil.rmtree(os.path.join(DATA_PLANE_DIR, name), ignore_errors=True)
+    return generation
+
+
+# --- Reading (API worker side) ---
+class DataPlane:
+    """
+    Zero-copy reader over the current generation.
+
+    Arrays are numpy views onto a read-only mmap of data.bin, so every worker
+    shares the same page-cache pages. A new generation is picked up at most
+    REFRESH_SECONDS after it is published.
+    """
+
+    def __init__(self, refresh_seconds=REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        # (generation, index, buffer) swapped as one reference so readers
+        # never pair an index with another generation's buffer
+        self._current = (None, {}, b'')
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_seconds:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                with open(CURRENT_FILE, 'r') as f:
+                    generation = f.read().strip()
+            except FileNotFoundError:
+                return
+            if generation == self._current[0]:
+                return
+            gen_dir = os.path.join(DATA_PLANE_DIR, generation)
+            try:
+                with open(os.path.join(gen_dir, 'index.json'), 'r') as f:
+                    index = json.load(f)
+                buffer = b''
+                with open(os.path.join(gen_dir, 'data.bin'), 'rb') as f:
+                    if os.fstat(f.fileno()).st_size:
+                        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError) as e:
+                print(f"Error loading data plane generation {generation}: {e}")
+                return
+            # Old mappings are released once no array view references them
+            self._current = (generation, index["cities"], buffer)
+
+    @property
+    def generation(self):
+        self._refresh()
+        return self._current[0]
+
+    def cities(self):
+        self._refresh()
+        return list(self._current[1])
+
+    def get(self, city, name):
+        """Read-only array for a city, or None when it was not published"""
+        self._refresh()
+        _, index, buffer = self._current
+        entry = index.get(city, {}).get(name)
+        if entry is None:
+            return None
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"]))
+        return np.frombuffer(buffer, dtype=dtype, count=count, offset=entry["offset"]).reshape(entry["shape"])
+
+    def names(self, city):
+        self._refresh()
+        return list(self._current[1].get(city, {}))
+
+
+data_plane = DataPlane()
+
+if __name__ == "__main__":
+    publish_data_plane([city.strip() for city in os.getenv('CITY_LIST', 'London,Paris,New York').split(',')])
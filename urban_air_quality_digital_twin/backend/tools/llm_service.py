@@ -0,0 +1,203 @@
+# File: src/urban_air_quality_digital_twin/tools/llm_service.py
+# Description: Off-event-loop LLM generation with token streaming, request coalescing and admission control
+#
+# Everything here is per process: each uvicorn worker loads its own model
+# copy, coalesces only the requests it receives, and applies its own
+# LLM_MAX_PENDING limit. With N workers that is N models (~1GB each) and up
+# to N * LLM_MAX_PENDING generations in flight, and the same prompt on two
+# workers is generated twice. Size LLM_MAX_PENDING per worker accordingly.
+
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+try:
+    from transformers.models.auto.tokenization_auto import AutoTokenizer
+    from transformers.models.auto.modeling_auto import AutoModelForSeq2SeqLM
+    from transformers.generation.streamers import TextStreamer
+    import torch
+    LLM_AVAILABLE = True
+except ImportError:
+    LLM_AVAILABLE = False
+
+load_dotenv()
+
+HUGGINGFACE_MODEL_NAME = "google/flan-t5-base"
+DEVICE = "cuda" if LLM_AVAILABLE and torch.cuda.is_available() else "cpu"
+
+# Threads running model.generate; one model instance is shared by all of them
+WORKERS = int(os.getenv('LLM_WORKERS', '1'))
+# Distinct generations allowed to run or wait; beyond this requests get a 429
+MAX_PENDING = int(os.getenv('LLM_MAX_PENDING', '8'))
+
+GENERATION_KWARGS = {
+    "max_length": 256,
+    "temperature": 0.7,
+    "do_sample": True,
+    "top_p": 0.9,
+}
+
+
+class LLMOverloaded(Exception):
+    """Raised when the admission queue is full"""
+
+
+def build_analysis_prompt(city, state):
+    """Analysis prompt for a city built from its rolling-window state"""
+    windows = state.windows
+    data_summary = f"""
+        Air quality data for {city}:
+        - PM2.5 average: {windows['pm2_5'].lifetime_mean():.3f} ug/m3
+        - PM10 average: {windows['pm10'].lifetime_mean():.3f} ug/m3
+        - Nitrogen dioxide average: {windows['nitrogen_dioxide'].lifetime_mean():.3f} ug/m3
+        - Data points: {windows['pm2_5'].total_count}
+        - Time range: {state.first_time} to {state.last_time}
+
+        Recent trends:
+        - PM2.5 trend: {windows['pm2_5'].trend()}
+        - PM10 trend: {windows['pm10'].trend()}
+        """
+
+    return f"""
+        Analyze this air quality data and provide insights:
+        {data_summary}
+
+        Please provide:
+        1. Health implications
+        2. Potential causes
+        3. Recommendations for improvement
+        """
+
+
+def load_model():
+    """Load the Hugging Face tokenizer and model, or None when unavailable"""
+    if not LLM_AVAILABLE:
+        return None
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(HUGGINGFACE_MODEL_NAME)
+        model = AutoModelForSeq2SeqLM.from_pretrained(HUGGINGFACE_MODEL_NAME)
+        model.to(DEVICE)
+        return tokenizer, model
+    except Exception as e:
+        print(f"Error loading LLM: {e}")
+        return None
+
+
+def generate_text(tokenizer, model, prompt, streamer=None):
+    """Blocking generation with the shared settings; streamer receives text as it is decoded"""
+    inputs = tokenizer(prompt, return_tensors="pt", max_length=512, truncation=True)
+    inputs = {k: v.to(DEVICE) for k, v in inputs.items()}
+    with torch.no_grad():
+        outputs = model.generate(**inputs, streamer=streamer, **GENERATION_KWARGS)
+    return tokenizer.decode(outputs[0], skip_special_tokens=True)
+
+
+class Generation:
+    """
+    Output of one model.generate call, shared by every request for the same prompt.
+
+    Chunks are appended on the event loop; subscribers that join late replay
+    the chunks produced so far and then follow along.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._event = asyncio.Event()
+
+    def _wake(self):
+        self._event.set()
+        self._event = asyncio.Event()
+
+    def push(self, text):
+        if text:
+            self.chunks.append(text)
+            self._wake()
+
+    def finish(self, error=None):
+        self.error = error
+        self.done = True
+        self._wake()
+
+    async def stream(self):
+        i = 0
+        while True:
+            while i < len(self.chunks):
+                yield self.chunks[i]
+                i += 1
+            if self.done:
+                if self.error:
+                    raise self.error
+                return
+            await self._event.wait()
+
+    async def text(self):
+        return "".join([chunk async for chunk in self.stream()])
+
+
+if LLM_AVAILABLE:
+    class LoopStreamer(TextStreamer):
+        """Forwards decoded text from the generation thread to a Generation on the event loop"""
+
+        def __init__(self, tokenizer, generation, loop):
+            super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+            self.generation = generation
+            self.loop = loop
+
+        def on_finalized_text(self, text, stream_end=False):
+            self.loop.call_soon_threadsafe(self.generation.push, text)
+
+
+class LLMService:
+    """Runs generations in worker threads and coalesces identical in-flight prompts (per process)"""
+
+    def __init__(self, workers=WORKERS, max_pending=MAX_PENDING):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='llm')
+        self._inflight = {}
+        self._components = None
+        self._load_lock = threading.Lock()
+
+    def _load(self):
+        """Load the tokenizer and model once, on first use"""
+        with self._load_lock:
+            if self._components is None:
+                self._components = load_model()
+            return self._components
+
+    def _generate(self, prompt, generation, loop):
+        try:
+            components = self._load()
+            if components is None:
+                loop.call_soon_threadsafe(generation.push, "LLM analysis not available")
+            else:
+                tokenizer, model = components
+                generate_text(tokenizer, model, prompt, LoopStreamer(tokenizer, generation, loop))
+            loop.call_soon_threadsafe(generation.finish)
+        except Exception as e:
+            loop.call_soon_threadsafe(generation.finish, e)
+
+    def submit(self, prompt):
+        """
+        Start (or join) the generation for a prompt. Must be called from the
+        event loop; raises LLMOverloaded when MAX_PENDING generations are
+        already running or queued.
+        """
+        key = prompt.strip()
+        generation = self._inflight.get(key)
+        if generation is not None:
+            return generation
+        if len(self._inflight) >= self.max_pending:
+            raise LLMOverloaded(f"{len(self._inflight)} generations in progress")
+        loop = asyncio.get_running_loop()
+        generation = Generation()
+        self._inflight[key] = generation
+        future = loop.run_in_executor(self._executor, self._generate, key, generation, loop)
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return generation
+
+
+llm_service = LLMService()
@@ -8,18 +8,13 @@ from dotenv import load_dotenv
 from datetime import datetime
 import matplotlib.pyplot as plt
 from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error
 import json
+from tools.catalog import latest_artifact, record_artifact, apply_retention, get_artifact, artifacts_between, compact
+from tools.data_plane import publish_data_plane
+from tools.rolling_analytics import CityRollingState, load_city_state, save_city_state
+from tools.llm_service import LLM_AVAILABLE, build_analysis_prompt, generate_text, load_model
 
-# Import LLM for enhanced analysis
-try:
-    from transformers.models.auto.tokenization_auto import AutoTokenizer
-    from transformers.models.auto.modeling_auto import AutoModelForSeq2SeqLM
-    import torch
-    LLM_AVAILABLE = True
-except ImportError:
-    LLM_AVAILABLE = False
+if not LLM_AVAILABLE:
     print("Warning: Transformers not available. LLM analysis will be skipped.")
 
 # Directories
@@ -33,95 +28,58 @@ load_dotenv()
 # Ensure plots directory exists
 os.makedirs(PLOTS_DIR, exist_ok=True)
 
-# LLM Configuration
-HUGGINGFACE_MODEL_NAME = "google/flan-t5-base"
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-
 def load_llm():
-    """Load the Hugging Face LLM for analysis"""
-    if not LLM_AVAILABLE:
-        return None
-    
-    try:
-        tokenizer = AutoTokenizer.from_pretrained(HUGGINGFACE_MODEL_NAME)
-        model = AutoModelForSeq2SeqLM.from_pretrained(HUGGINGFACE_MODEL_NAME)
-        model.to(DEVICE)
-        return tokenizer, model
-    except Exception as e:
-        print(f"Error loading LLM: {e}")
-        return None
+    """Load the Hugging Face LLM for analysis (model and settings live in llm_service)"""
+    return load_model()
 
-def generate_llm_analysis(df, city, tokenizer, model):
+def generate_llm_analysis(df, city, tokenizer, model, state=None):
     """Generate LLM-powered analysis of air quality data"""
     if not tokenizer or not model:
         return "LLM analysis not available"
     
     try:
-        # Prepare data summary for LLM
-        data_summary = f"""
-        Air quality data for {city}:
-        - PM2.5 average: {df['pm2_5'].mean():.3f}
-        - PM10 average: {df['pm10'].mean():.3f}
-        - Nitrogen dioxide average: {df['nitrogen_dioxide'].mean():.3f}
-        - Data points: {len(df)}
-        - Time range: {df.index[0]} to {df.index[-1]}
-        
-        Recent trends:
-        - PM2.5 trend: {'increasing' if df['pm2_5'].iloc[-24:].mean() > df['pm2_5'].iloc[-48:-24].mean() else 'decreasing'}
-        - PM10 trend: {'increasing' if df['pm10'].iloc[-24:].mean() > df['pm10'].iloc[-48:-24].mean() else 'decreasing'}
-        """
-        
-        # Create prompt for analysis
-        prompt = f"""
-        Analyze this air quality data and provide insights:
-        {data_summary}
-        
-        Please provide:
-        1. Health implications
-        2. Potential causes
-        3. Recommendations for improvement
-        """
+        if state is None:
+            state = CityRollingState.from_frame(df, city)
+
+        # Create prompt for analysis (shared with the streaming API endpoints)
+        prompt = build_analysis_prompt(city, state)
         
         # Generate response
-        inputs = tokenizer(prompt, return_tensors="pt", max_length=512, truncation=True)
-        inputs = {k: v.to(DEVICE) for k, v in inputs.items()}
-        
-        with torch.no_grad():
-            outputs = model.generate(
-                **inputs,
-                max_length=256,
-                temperature=0.7,
-                do_sample=True,
-                top_p=0.9
-            )
-        
-        response = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        return response
+        return generate_text(tokenizer, model, prompt)
         
     except Exception as e:
         return f"LLM analysis failed: {e}"
 
 # --- Pattern Detection and Insight Generation ---
-def detect_patterns_and_generate_insights(df, city):
+def detect_patterns_and_generate_insights(df, city, state=None):
+    """
+    Summarize high-pollution events, trends and shifts per pollutant.
+
+    Reads from the city's rolling state, so the cost does not grow with
+    history; without a state one is built from df, which must then hold raw
+    (unnormalized) readings.
+    """
+    if state is None:
+        state = CityRollingState.from_frame(df, city)
     insights = {}
-    for col in ['pm2_5', 'pm10', 'nitrogen_dioxide']:
-        if col in df.columns:
-            # Count high pollution events (above normalized threshold of 0.8)
-            high_events = (df[col] > 0.8).sum()
-            insights[col] = f"{high_events} high {col} events in recent data."
-
-            # Detect simple trend using linear regression
-            y = df[col].values[-48:]
-            if len(y) > 1:
-                x = np.arange(len(y)).reshape(-1, 1)
-                model = LinearRegression().fit(x, y)
-                slope = model.coef_[0]
+    for col, window in state.windows.items():
+        if window.total_count:
+            # Count high pollution events (above the WHO guideline level)
+            insights[col] = f"{window.exceedances} high {col} events in the last {window.count}h."
+
+            # Detect simple trend from the least-squares slope of the window,
+            # relative to its mean so the threshold does not depend on units
+            if window.count > 1:
+                slope = window.relative_slope()
                 if slope > 0.01:
                     insights[f"{col}_trend"] = f"Increasing trend in {col}"
                 elif slope < -0.01:
                     insights[f"{col}_trend"] = f"Decreasing trend in {col}"
                 else:
                     insights[f"{col}_trend"] = f"Stable {col} trend"
+
+            if window.change_point():
+                insights[f"{col}_change_point"] = f"Sudden shift in {col} over the last {window.short_size}h"
     return insights
 
 # --- Visualization ---
@@ -137,6 +95,7 @@ def visualize_trends(df, city):
     plot_path = os.path.join(PLOTS_DIR, f"{city}_trend.png")
     plt.savefig(plot_path)
     plt.close()
+    record_artifact(city, 'plot', plot_path)
     print(f"Saved trend plot: {plot_path}")
 
 # --- Forecasting ---
@@ -165,6 +124,16 @@ def simulate_what_if(df, target_col, scenario_desc):
     y_pred = np.clip(y_pred, 0, 1)
     return y_pred.tolist()
 
+def load_raw_readings(city, processed_path):
+    """Raw readings of the fetch a processed file was built from, or None"""
+    entry = get_artifact(processed_path)
+    if entry is None:
+        return None
+    for raw in artifacts_between(city, 'raw', entry['timestamp'], entry['timestamp']):
+        if os.path.exists(raw['path']):
+            return pd.read_csv(raw['path']).drop_duplicates()
+    return None
+
 # --- Main Execution ---
 def main():
     print("Loading LLM for enhanced analysis...")
@@ -172,28 +141,41 @@ def main():
     
     cities = os.getenv('CITY_LIST', 'London,Paris,New York').split(',')
     for city in map(str.strip, cities):
-        city_files = [
-            f for f in os.listdir(PROCESSED_DATA_DIR)
-            if city in f and f.endswith('_processed.csv')
-        ]
-        if not city_files:
+        latest_file = latest_artifact(city, 'processed')
+        if latest_file and not os.path.exists(latest_file):
+            # Deleted outside the pipeline: drop stale entries and look again
+            print(f"Catalogued file is missing, compacting catalog: {latest_file}")
+            compact()
+            latest_file = latest_artifact(city, 'processed')
+        if not latest_file:
             print(f"No processed data found for {city}")
             continue
 
-        latest_file = max(
-            city_files,
-            key=lambda f: os.path.getmtime(os.path.join(PROCESSED_DATA_DIR, f))
-        )
-        df = pd.read_csv(os.path.join(PROCESSED_DATA_DIR, latest_file))
+        try:
+            df = pd.read_csv(latest_file)
+        except Exception as e:
+            print(f"Error reading {latest_file}: {e}")
+            continue
+
+        # Advance the persistent rolling state with the observed hours not
+        # seen yet. It is fed raw readings: processed files are each scaled
+        # differently, and the update drops the fetch's forecast hours.
+        state = load_city_state(city)
+        raw_df = load_raw_readings(city, latest_file)
+        if raw_df is not None:
+            state.update(raw_df)
+            save_city_state(state)
+        else:
+            print(f"No raw data found for {latest_file}; rolling state not updated")
 
         # Detect patterns and generate insights
-        insights = detect_patterns_and_generate_insights(df, city)
+        insights = detect_patterns_and_generate_insights(df, city, state)
         print(f"Insights for {city}: {insights}")
 
         # Generate LLM analysis
         if llm_components:
             tokenizer, model = llm_components
-            llm_analysis = generate_llm_analysis(df, city, tokenizer, model)
+            llm_analysis = generate_llm_analysis(df, city, tokenizer, model, state)
             print(f"LLM Analysis for {city}: {llm_analysis}")
         else:
             llm_analysis = "LLM analysis not available"
@@ -223,11 +205,13 @@ def main():
         forecast_path = os.path.join(PREDICTIONS_DIR, f"{city}_forecast_{timestamp}.json")
         with open(forecast_path, 'w') as f:
             json.dump(forecast, f, indent=2)
+        record_artifact(city, 'forecast', forecast_path, timestamp)
         
         # Save scenario
         scenario_path = os.path.join(PREDICTIONS_DIR, f"{city}_scenario_{timestamp}.json")
         with open(scenario_path, 'w') as f:
             json.dump(scenario, f, indent=2)
+        record_artifact(city, 'scenario', scenario_path, timestamp)
         
         # Save LLM analysis
         analysis_path = os.path.join(PREDICTIONS_DIR, f"{city}_llm_analysis_{timestamp}.json")
@@ -240,10 +224,19 @@ def main():
         }
         with open(analysis_path, 'w') as f:
             json.dump(analysis_data, f, indent=2)
+        record_artifact(city, 'analysis', analysis_path, timestamp)
 
         print(f"Saved forecast to {forecast_path}")
         print(f"Saved scenario simulation to {scenario_path}")
         print(f"Saved LLM analysis to {analysis_path}")
 
+    # Make the new series and forecasts visible to every API worker at once
+    publish_data_plane(list(map(str.strip, cities)))
+
+    # Drop expired artifacts (no-op unless ARTIFACT_RETENTION_DAYS is set)
+    removed = apply_retention()
+    if removed:
+        print(f"Retention removed {removed} old artifacts")
+
 if __name__ == "__main__":
     main()
@@ -2,35 +2,161 @@
 # Description: Cleans and preprocesses raw air quality data for downstream use
 
 import os
+from collections import deque
 import pandas as pd
 import numpy as np
 from glob import glob
+from tools.catalog import record_derived_artifact
 
 RAW_DATA_DIR = os.path.join(os.path.dirname(__file__), '../../../data/raw')
 PROCESSED_DATA_DIR = os.path.join(os.path.dirname(__file__), '../../../data/processed')
 
+POLLUTANT_COLUMNS = ['pm10', 'pm2_5', 'carbon_monoxide', 'nitrogen_dioxide', 'ozone', 'sulphur_dioxide']
 
-def clean_and_preprocess():
+# Compact dtypes: pollutant readings fit comfortably in float32 and the
+# city/fetch timestamp strings repeat on every row, so store them as categories.
+RAW_DTYPES = {col: 'float32' for col in POLLUTANT_COLUMNS}
+RAW_DTYPES.update({'city': 'category', 'timestamp': 'category'})
+
+# Streaming mode settings. Files larger than the threshold are processed in
+# chunks so peak memory depends on the chunk size, not on the file size.
+CHUNK_SIZE = int(os.getenv('PREPROCESS_CHUNK_SIZE', '100000'))
+STREAMING_THRESHOLD_MB = float(os.getenv('PREPROCESS_STREAMING_THRESHOLD_MB', '256'))
+# Number of most recent row hashes kept for cross-chunk deduplication.
+# Duplicates come from overlapping fetches and sit close together, so a
+# bounded window catches them without keeping a hash for every row.
+DEDUP_WINDOW_ROWS = int(os.getenv('PREPROCESS_DEDUP_WINDOW_ROWS', '1000000'))
+
+
+def _normalize(df, stats):
+    """Min-max scale pollutant columns in place using {col: (min, max)}"""
+    for col, (min_val, max_val) in stats.items():
+        if col in df.columns and max_val > min_val:
+            df[col] = ((df[col] - min_val) / (max_val - min_val)).astype('float32')
+    return df
+
+
+def _update_min_max(stats, df):
+    """Fold the per-column min/max of a chunk into running statistics"""
+    for col in POLLUTANT_COLUMNS:
+        if col in df.columns:
+            chunk_min = df[col].min()
+            chunk_max = df[col].max()
+            if col in stats:
+                chunk_min = min(chunk_min, stats[col][0])
+                chunk_max = max(chunk_max, stats[col][1])
+            stats[col] = (chunk_min, chunk_max)
+    return stats
+
+
+def _fill_from_carry(chunk, carry):
+    """Fill leading gaps of a forward-filled chunk with the previous chunk's last values"""
+    if carry is None:
+        return chunk
+    for col in chunk.columns:
+        value = carry.get(col)
+        if pd.isna(value) or not chunk[col].isna().any():
+            continue
+        if isinstance(chunk[col].dtype, pd.CategoricalDtype) and value not in chunk[col].cat.categories:
+            chunk[col] = chunk[col].cat.add_categories([value])
+        chunk[col] = chunk[col].fillna(value)
+    return chunk
+
+
+def _fill_zero(df):
+    """Zero-fill pollutant gaps; categorical text columns cannot hold a 0"""
+    cols = [col for col in POLLUTANT_COLUMNS if col in df.columns]
+    df[cols] = df[cols].fillna(0)
+    return df
+
+
+def process_file_in_memory(file, processed_path):
+    df = pd.read_csv(file, dtype=RAW_DTYPES)
+    # Drop duplicates
+    df = df.drop_duplicates()
+    # Fill missing values with forward fill, then zero
+    df = _fill_zero(df.ffill())
+    # Normalize numeric columns (min-max scaling)
+    _normalize(df, _update_min_max({}, df))
+    df.to_csv(processed_path, index=False)
+
+
+def process_file_streaming(file, processed_path, chunksize=CHUNK_SIZE):
+    """
+    Two-pass chunked preprocessing with bounded memory.
+
+    Pass 1 deduplicates and forward fills each chunk (carrying the last row
+    across chunk boundaries), accumulates min/max and spills the cleaned rows
+    to a temporary file. Pass 2 rescales the spilled rows with the global
+    statistics and writes the processed file.
+    """
+    tmp_path = processed_path + '.tmp'
+    stats = {}
+    carry = None
+    recent_hashes = deque()
+    recent_rows = 0
+    header = True
+    try:
+        for chunk in pd.read_csv(file, dtype=RAW_DTYPES, chunksize=chunksize):
+            # Drop duplicates within the chunk and against recently seen rows
+            hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+            keep = ~pd.Series(hashes).duplicated().to_numpy()
+            if recent_hashes:
+                keep &= ~np.isin(hashes, np.concatenate(recent_hashes))
+            chunk = chunk[keep]
+            hashes = hashes[keep]
+            recent_hashes.append(hashes)
+            recent_rows += len(hashes)
+            while len(recent_hashes) > 1 and recent_rows - len(recent_hashes[0]) >= DEDUP_WINDOW_ROWS:
+                recent_rows -= len(recent_hashes.popleft())
+            if chunk.empty:
+                continue
+
+            # Forward fill, continuing from the previous chunk, then zero
+            chunk = _fill_from_carry(chunk.ffill(), carry)
+            carry = chunk.iloc[-1]
+            chunk = _fill_zero(chunk)
+
+            _update_min_max(stats, chunk)
+            chunk.to_csv(tmp_path, mode='w' if header else 'a', header=header, index=False)
+            header = False
+
+        if header:
+            # No rows survived; still emit an empty file with the raw header
+            pd.read_csv(file, nrows=0).to_csv(processed_path, index=False)
+            return
+
+        header = True
+        for chunk in pd.read_csv(tmp_path, dtype=RAW_DTYPES, chunksize=chunksize):
+            _normalize(chunk, stats)
+            chunk.to_csv(processed_path, mode='w' if header else 'a', header=header, index=False)
+            header = False
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def clean_and_preprocess(streaming=None, chunksize=CHUNK_SIZE):
+    """
+    Clean and normalize every raw CSV into data/processed.
+
+    streaming=None picks chunked processing for files larger than
+    PREPROCESS_STREAMING_THRESHOLD_MB; True/False forces the mode.
+    """
     os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
     raw_files = glob(os.path.join(RAW_DATA_DIR, '*.csv'))
     for file in raw_files:
         try:
-            df = pd.read_csv(file)
-            # Drop duplicates
-            df = df.drop_duplicates()
-            # Fill missing values with forward fill, then zero
-            df = df.fillna(method='ffill').fillna(0)
-            # Normalize numeric columns (min-max scaling)
-            for col in ['pm10', 'pm2_5', 'carbon_monoxide', 'nitrogen_dioxide', 'ozone', 'sulphur_dioxide']:
-                if col in df.columns:
-                    min_val = df[col].min()
-                    max_val = df[col].max()
-                    if max_val > min_val:
-                        df[col] = (df[col] - min_val) / (max_val - min_val)
-            # Save processed file
             base = os.path.basename(file)
             processed_path = os.path.join(PROCESSED_DATA_DIR, base.replace('.csv', '_processed.csv'))
-            df.to_csv(processed_path, index=False)
+            use_streaming = streaming
+            if use_streaming is None:
+                use_streaming = os.path.getsize(file) > STREAMING_THRESHOLD_MB * 1024 * 1024
+            if use_streaming:
+                process_file_streaming(file, processed_path, chunksize=chunksize)
+            else:
+                process_file_in_memory(file, processed_path)
+            record_derived_artifact(file, 'processed', processed_path)
             print(f"Processed and saved: {processed_path}")
         except Exception as e:
             print(f"Error processing {file}: {e}")
@@ -0,0 +1,303 @@
+# File: src/urban_air_quality_digital_twin/tools/rolling_analytics.py
+# Description: Persistent per-city rolling-window statistics updated in O(1) per hourly reading
+
+import os
+import json
+import math
+import numpy as np
+import pandas as pd
+from tools.data_fetcher import observed_readings
+
+PROCESSED_DATA_DIR = os.path.join(os.path.dirname(__file__), '../../../data/processed')
+STATE_DIR = os.path.join(PROCESSED_DATA_DIR, 'state')
+
+# The state holds raw readings (ug/m3). Processed files are min-max scaled
+# per file, so mixing them would put each fetch on a different scale.
+TRACKED_COLUMNS = ['pm2_5', 'pm10', 'nitrogen_dioxide']
+WINDOW_HOURS = 48           # Trend window (matches the 48h regression it replaces)
+SHORT_WINDOW_HOURS = 24     # Recent vs. previous day comparison
+# High-event thresholds in ug/m3 (WHO 2021 24-hour guideline levels)
+HIGH_EVENT_THRESHOLDS = {'pm2_5': 15.0, 'pm10': 45.0, 'nitrogen_dioxide': 25.0}
+CHANGE_POINT_Z = 3.0        # z-score between consecutive 24h means that flags a shift
+STATE_SCALE = 'raw'         # Saved states on any other scale are discarded
+# Missing hours up to this long are forward filled; a longer gap empties the
+# windows so readings from either side are never treated as adjacent hours
+MAX_FILL_HOURS = 6
+TIME_FORMAT = '%Y-%m-%dT%H:%M'  # Open-Meteo's hourly 'time' format
+
+
+class RollingWindow:
+    """Ring buffer with running sums giving constant-time window statistics"""
+
+    def __init__(self, threshold, size=WINDOW_HOURS, short_size=SHORT_WINDOW_HOURS):
+        self.size = size
+        self.short_size = min(short_size, size)
+        self.threshold = threshold
+        self.buffer = [0.0] * size
+        self.head = 0   # Ring position of the oldest value
+        self.count = 0  # Values currently in the window
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.sum_ky = 0.0  # Sum of k * y with k = 0 for the oldest value
+        self.short_sum = 0.0
+        self.short_sum_sq = 0.0
+        self.exceedances = 0
+        # Lifetime counters, never evicted
+        self.total_count = 0
+        self.total_sum = 0.0
+        self._pushes_since_resync = 0
+
+    def _at(self, i):
+        """Value i positions after the oldest one"""
+        return self.buffer[(self.head + i) % self.size]
+
+    def push(self, value):
+        value = float(value)
+        n = self.count
+        if n >= self.short_size:
+            leaving = self._at(n - self.short_size)
+            self.short_sum -= leaving
+            self.short_sum_sq -= leaving * leaving
+        if n == self.size:
+            oldest = self.buffer[self.head]
+            self.sum -= oldest
+            self.sum_sq -= oldest * oldest
+            self.exceedances -= oldest > self.threshold
+            # Every remaining value moves one step closer to the start
+            self.sum_ky -= self.sum
+            self.buffer[self.head] = value
+            self.head = (self.head + 1) % self.size
+            k = self.size - 1
+        else:
+            self.buffer[(self.head + n) % self.size] = value
+            self.count += 1
+            k = n
+        self.sum += value
+        self.sum_sq += value * value
+        self.sum_ky += k * value
+        self.short_sum += value
+        self.short_sum_sq += value * value
+        self.exceedances += value > self.threshold
+        self.total_count += 1
+        self.total_sum += value
+
+        # Recompute from the buffer once per window to stop float drift
+        self._pushes_since_resync += 1
+        if self._pushes_since_resync >= self.size:
+            self._resync()
+
+    def clear(self):
+        """Empty the window, keeping the lifetime counters"""
+        self.buffer = [0.0] * self.size
+        self.head = 0
+        self.count = 0
+        self.sum = self.sum_sq = self.sum_ky = 0.0
+        self.short_sum = self.short_sum_sq = 0.0
+        self.exceedances = 0
+        self._pushes_since_resync = 0
+
+    def _resync(self):
+        values = self.values()
+        recent = values[-self.short_size:]
+        self.sum = sum(values)
+        self.sum_sq = sum(v * v for v in values)
+        self.sum_ky = sum(k * v for k, v in enumerate(values))
+        self.short_sum = sum(recent)
+        self.short_sum_sq = sum(v * v for v in recent)
+        self._pushes_since_resync = 0
+
+    def values(self):
+        """Window contents, oldest first"""
+        return [self._at(i) for i in range(self.count)]
+
+    def last(self):
+        """Newest value in the window"""
+        return self._at(self.count - 1)
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def relative_slope(self):
+        """Slope as a fraction of the window mean per hour, independent of units"""
+        mean = self.mean()
+        return self.slope() / mean if mean > 0 else 0.0
+
+    def lifetime_mean(self):
+        return self.total_sum / self.total_count if self.total_count else 0.0
+
+    def recent_mean(self):
+        """Mean of the last SHORT_WINDOW_HOURS values"""
+        n = min(self.count, self.short_size)
+        return self.short_sum / n if n else float('nan')
+
+    def previous_mean(self):
+        """Mean of the values before the short window, NaN when there are none"""
+        n = self.count - min(self.count, self.short_size)
+        return (self.sum - self.short_sum) / n if n else float('nan')
+
+    def trend(self):
+        """'increasing' when the recent mean is above the previous one, else 'decreasing'"""
+        return 'increasing' if self.recent_mean() > self.previous_mean() else 'decreasing'
+
+    def slope(self):
+        """Least-squares slope of the window against its hour index"""
+        n = self.count
+        if n < 2:
+            return 0.0
+        sum_k = n * (n - 1) / 2
+        sum_kk = (n - 1) * n * (2 * n - 1) / 6
+        return (n * self.sum_ky - sum_k * self.sum) / (n * sum_kk - sum_k * sum_k)
+
+    def change_point(self):
+        """True when the recent mean differs from the previous one by more than CHANGE_POINT_Z"""
+        n_recent = min(self.count, self.short_size)
+        n_prev = self.count - n_recent
+        if n_recent < 2 or n_prev < 2:
+            return False
+        prev_sum = self.sum - self.short_sum
+        prev_sum_sq = self.sum_sq - self.short_sum_sq
+        recent_mean = self.short_sum / n_recent
+        prev_mean = prev_sum / n_prev
+        recent_var = max(self.short_sum_sq / n_recent - recent_mean ** 2, 0.0)
+        prev_var = max(prev_sum_sq / n_prev - prev_mean ** 2, 0.0)
+        stderr = math.sqrt(recent_var / n_recent + prev_var / n_prev)
+        if stderr == 0:
+            return recent_mean != prev_mean
+        return abs(recent_mean - prev_mean) / stderr > CHANGE_POINT_Z
+
+    def to_dict(self):
+        return {
+            "values": self.values(),
+            "total_count": self.total_count,
+            "total_sum": self.total_sum,
+        }
+
+    @classmethod
+    def from_dict(cls, data, **kwargs):
+        window = cls(**kwargs)
+        for value in data.get("values", [])[-window.size:]:
+            window.push(value)
+        window.total_count = data.get("total_count", window.total_count)
+        window.total_sum = data.get("total_sum", window.total_sum)
+        return window
+
+
+class CityRollingState:
+    """Rolling windows for every tracked pollutant of a single city"""
+
+    def __init__(self, city, columns=TRACKED_COLUMNS):
+        self.city = city
+        self.first_time = None
+        self.last_time = None
+        self.windows = {col: RollingWindow(HIGH_EVENT_THRESHOLDS[col]) for col in columns}
+
+    def update(self, df):
+        """
+        Push the raw readings in df that are newer than the last ingested hour.
+
+        Only unseen rows are touched, so the cost depends on how many new
+        hours arrived rather than on the length of df. Raw fetches (frames
+        with a 'timestamp' column) are cut at the fetch time so their
+        forecast hours never enter the window. New rows are laid on a
+        continuous hourly range: missing hours and values are forward filled
+        from the last ingested reading, except after a gap longer than
+        MAX_FILL_HOURS, which empties the windows and skips the rows before
+        it. Readings before the first valid value are skipped. Returns the
+        number of hours pushed.
+        """
+        if 'timestamp' in df.columns:
+            df = observed_readings(df)
+        if 'time' in df.columns:
+            df = self._new_hours(df)
+        if df.empty:
+            return 0
+        for col, window in self.windows.items():
+            if col in df.columns:
+                values = df[col].ffill()
+                if window.count:
+                    values = values.fillna(window.last())
+                for value in values.dropna().to_numpy():
+                    window.push(value)
+        if 'time' in df.columns:
+            if self.first_time is None:
+                self.first_time = df['time'].iloc[0]
+            self.last_time = df['time'].iloc[-1]
+        return len(df)
+
+    def _new_hours(self, df):
+        """Rows after last_time on a continuous hourly range; empties the windows after a long gap"""
+        df = df.assign(time=pd.to_datetime(df['time'])).drop_duplicates('time', keep='last').sort_values('time')
+        start = df['time'].iloc[0] if len(df) else None
+        if self.last_time is not None:
+            start = pd.Timestamp(self.last_time) + pd.Timedelta(hours=1)
+            df = df[df['time'] >= start]
+        if df.empty:
+            return df
+
+        # Hours missing before each row, counting from the last ingested hour
+        previous = df['time'].shift().fillna(start - pd.Timedelta(hours=1))
+        missing_hours = (df['time'] - previous) / pd.Timedelta(hours=1) - 1
+        long_gaps = np.flatnonzero(missing_hours > MAX_FILL_HOURS)
+        if len(long_gaps):
+            df = df.iloc[long_gaps[-1]:]
+            start = df['time'].iloc[0]
+            for window in self.windows.values():
+                window.clear()
+
+        hours = pd.date_range(start, df['time'].iloc[-1], freq='h', name='time')
+        df = df.set_index('time').reindex(hours).reset_index()
+        df['time'] = df['time'].dt.strftime(TIME_FORMAT)
+        return df
+
+    def to_dict(self):
+        return {
+            "city": self.city,
+            "scale": STATE_SCALE,
+            "first_time": self.first_time,
+            "last_time": self.last_time,
+            "windows": {col: window.to_dict() for col, window in self.windows.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(data["city"], columns=list(data.get("windows", {})) or TRACKED_COLUMNS)
+        state.first_time = data.get("first_time")
+        state.last_time = data.get("last_time")
+        for col, window in data.get("windows", {}).items():
+            state.windows[col] = RollingWindow.from_dict(window, threshold=HIGH_EVENT_THRESHOLDS[col])
+        return state
+
+    @classmethod
+    def from_frame(cls, df, city):
+        """State built from a frame of raw (unnormalized) readings"""
+        state = cls(city)
+        state.update(df)
+        return state
+
+
+def _state_path(city):
+    return os.path.join(STATE_DIR, f"{city}_rolling_state.json")
+
+
+def load_city_state(city):
+    """Load the persisted state for a city, or start an empty one"""
+    path = _state_path(city)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            if data.get("scale") == STATE_SCALE:
+                return CityRollingState.from_dict(data)
+            print(f"Discarding rolling state for {city} saved on another scale")
+        except Exception as e:
+            print(f"Error loading rolling state for {city}: {e}")
+    return CityRollingState(city)
+
+
+def save_city_state(state):
+    os.makedirs(STATE_DIR, exist_ok=True)
+    path = _state_path(state.city)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state.to_dict(), f)
+    os.replace(tmp_path, path)